@@ -26,6 +26,8 @@ Distributed under the terms of the GNU General Public License v2
 """
 
 import os
+import tempfile
+import time
 
 from mirrorselect.mirrorparser3 import MirrorParser3
 from sslfetch.connections import Connector
@@ -33,6 +35,42 @@ from mirrorselect.version import version
 
 USERAGENT = "Mirrorselect-" + version
 
+# Mirror lists younger than this many seconds are used without asking
+# the server whether they changed.
+CACHE_TTL = 24 * 60 * 60
+
+
+def get_cache_dir():
+    """Returns the directory the downloaded mirror lists are kept in"""
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "mirrorselect")
+
+
+def _read_cache(path):
+    """Returns the cached text at path, or None if it cannot be read"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _write_atomic(path, data):
+    """Writes data, bytes or text, to path through a temporary file, so that
+    an interrupted write never leaves a truncated file behind"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        if isinstance(data, bytes):
+            with open(fd, "wb") as f:
+                f.write(data)
+        else:
+            with open(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
 
 class Extractor:
     """The Extractor employs a MirrorParser3 object to get a list of valid
@@ -113,8 +151,7 @@ class Extractor:
             "kwargs-error": {"level": 0},
         }
 
-        fetcher = Connector(connector_output, self.proxies, USERAGENT)
-        success, mirrorlist, timestamp = fetcher.fetch_content(url, climit=60)
+        mirrorlist = self.fetch_cached(url, connector_output)
         parser.parse(mirrorlist)
 
         if (not mirrorlist) or len(parser.tuples()) == 0:
@@ -125,3 +162,57 @@ class Extractor:
         self.output.write(" Got %d mirrors.\n" % len(parser.tuples()))
 
         return parser.tuples()
+
+    def fetch_cached(self, url, connector_output):
+        """
+        Returns the content of url, kept in the cache directory between runs.
+        A cached copy younger than CACHE_TTL is used as is, an older one is
+        revalidated with an If-Modified-Since request.  A cached copy that
+        cannot be read is ignored.
+        """
+        cache_path = os.path.join(get_cache_dir(), os.path.basename(url))
+        tpath = cache_path + ".timestamp"
+
+        try:
+            age = time.time() - os.path.getmtime(cache_path)
+        except OSError:
+            age = None
+        cached = _read_cache(cache_path) if age is not None else None
+        if cached is None:
+            age = None
+        self.output.write(f"fetch_cached(): {cache_path} age: {age}\n", 2)
+
+        if age is not None and age < CACHE_TTL:
+            return cached
+
+        fetcher = Connector(connector_output, self.proxies, USERAGENT)
+        success, mirrorlist, timestamp = fetcher.fetch_content(
+            url,
+            tpath=tpath if age is not None and os.path.exists(tpath) else None,
+            climit=60,
+        )
+
+        if success:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                # the body goes first, a stale timestamp only costs a refetch
+                _write_atomic(cache_path, mirrorlist)
+                if timestamp:
+                    _write_atomic(tpath, timestamp)
+                elif os.path.exists(tpath):
+                    os.unlink(tpath)
+            except OSError as e:
+                self.output.write(f"fetch_cached(): failed to cache {url}: {e}\n", 2)
+            return mirrorlist
+
+        if age is None:
+            return mirrorlist
+
+        # fetch errors exit through print_err, so this is "not modified":
+        # restart the TTL of the cached copy
+        self.output.write(f"fetch_cached(): using cached {cache_path}\n", 2)
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return cached
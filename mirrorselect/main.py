@@ -31,10 +31,10 @@ Distributed under the terms of the GNU General Public License v2
 import os
 import socket
 import sys
-from optparse import OptionParser
+from argparse import ArgumentParser
 from mirrorselect.mirrorparser3 import MIRRORS_3_XML, MIRRORS_RSYNC_DATA
 from mirrorselect.output import Output, ColoredFormatter
-from mirrorselect.selectors import Deep, Shallow, Interactive
+from mirrorselect.selectors import Deep, Shallow, Interactive, shuffle_ranked
 from mirrorselect.extractor import Extractor
 from mirrorselect.configs import (
     get_make_conf_path,
@@ -60,6 +60,227 @@ if "GENTOO_PORTAGE_EPREFIX" in EPREFIX:
     EPREFIX = ""
 
 
+def _build_parser():
+    """Builds the command line parser, once per process."""
+    output = Output()
+    desc = "\n".join(
+        (
+            output.white("examples:"),
+            "",
+            output.white("	 automatic:"),
+            "		 # mirrorselect -s5",
+            "		 # mirrorselect -s3 -b10 -o >> /mnt/gentoo/etc/portage/make.conf",
+            "		 # mirrorselect -D -s4",
+            "",
+            output.white("	 interactive:"),
+            "		 # mirrorselect -i -r",
+        )
+    )
+
+    parser = ArgumentParser(
+        formatter_class=ColoredFormatter,
+        description=desc,
+    )
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="Mirrorselect version: %s" % version,
+    )
+
+    group = parser.add_argument_group("Main modes")
+    group.add_argument(
+        "-a",
+        "--all_mirrors",
+        action="store_true",
+        default=False,
+        help="This will present a list of all filtered search results "
+        "to make it possible to select mirrors you wish to use. "
+        " For the -r, --rsync option, it will select the rotation server "
+        "only. As multiple rsync URL's are not supported.",
+    )
+    group.add_argument(
+        "-D",
+        "--deep",
+        action="store_true",
+        default=False,
+        help="Deep mode. This is used to give a more accurate "
+        "speed test. It will download a 100k file from "
+        "each server. Because of this you should only use "
+        "this option if you have a good connection.",
+    )
+    group.add_argument(
+        "-i",
+        "--interactive",
+        action="store_true",
+        default=False,
+        help="Interactive Mode, this will present a list "
+        "to make it possible to select mirrors you wish to use.",
+    )
+
+    group = parser.add_argument_group("Server type selection (choose at most one)")
+    group.add_argument(
+        "-c",
+        "--country",
+        action="store",
+        default=None,
+        help="only use mirrors from the specified country "
+        "NOTE: Names with a space must be quoted "
+        "eg.:  -c 'South Korea'",
+    )
+    group.add_argument(
+        "-F",
+        "--ftp",
+        action="store_true",
+        default=False,
+        help="ftp only mode. Will not consider hosts of other " "types.",
+    )
+    group.add_argument(
+        "-H",
+        "--http",
+        action="store_true",
+        default=False,
+        help="http only mode. Will not consider hosts of other types",
+    )
+    group.add_argument(
+        "-S",
+        "--https",
+        action="store_true",
+        default=False,
+        help="https only mode. Will not consider hosts of other types",
+    )
+    group.add_argument(
+        "-r",
+        "--rsync",
+        action="store_true",
+        default=False,
+        help="rsync mode. Allows you to interactively select your"
+        " rsync mirror. Requires -i or -a to be used.",
+    )
+    group.add_argument(
+        "-R",
+        "--region",
+        action="store",
+        default=None,
+        help="only use mirrors from the specified region "
+        "NOTE: Names with a space must be quoted "
+        "eg.:  -R 'North America'",
+    )
+    group.add_argument(
+        "-4", "--ipv4", action="store_true", default=False, help="only use IPv4"
+    )
+    group.add_argument(
+        "-6", "--ipv6", action="store_true", default=False, help="only use IPv6"
+    )
+
+    group = parser.add_argument_group("Other options")
+    group.add_argument(
+        "-b",
+        "--blocksize",
+        action="store",
+        type=int,
+        help="This is to be used in automatic mode "
+        "and limits the number of hosts probed at the same time "
+        "to BLOCKSIZE (default 32, at most 64). This is required for certain "
+        "routers which block 40+ requests at any given time. "
+        "Recommended parameters to pass are: -s3 -b10",
+    )
+    group.add_argument(
+        "-d",
+        "--debug",
+        action="store",
+        type=int,
+        dest="verbosity",
+        default=1,
+        help="debug mode, pass in the debug level [1-9]",
+    )
+    group.add_argument(
+        "-f",
+        "--file",
+        action="store",
+        default="mirrorselect-test",
+        help="An alternate file to download for deep testing. "
+        "Please choose the file carefully as to not abuse the system "
+        "by selecting an overly large size file.  You must also "
+        " use the -m, --md5 option.",
+    )
+    group.add_argument(
+        "-m",
+        "--md5",
+        action="store",
+        default="bdf077b2e683c506bf9e8f2494eeb044",
+        help="An alternate file md5sum value used to compare the downloaded "
+        "file against for deep testing.",
+    )
+    group.add_argument(
+        "-o",
+        "--output",
+        action="store_true",
+        default=False,
+        help="Output Only Mode, this is especially useful "
+        "when being used during installation, to redirect "
+        "output to a file other than the portage configuration file "
+        "(make.conf, or repos.conf/gentoo.conf in rsync mode)",
+    )
+    group.add_argument(
+        "-P",
+        "--proxy",
+        action="store",
+        default=None,
+        help="Proxy server to use if not the default proxy " "in the environment",
+    )
+    group.add_argument(
+        "-q",
+        "--quiet",
+        action="store_const",
+        const=0,
+        dest="verbosity",
+        help="Quiet mode",
+    )
+    group.add_argument(
+        "-s",
+        "--servers",
+        action="store",
+        type=int,
+        default=None,
+        help="Specify Number of servers for Automatic Mode "
+        "to select. this is only valid for download mirrors. "
+        "If this is not specified, a default of 1 is used.",
+    )
+    group.add_argument(
+        "--shuffle-threshold",
+        action="store",
+        type=float,
+        default=2.0,
+        help="When selecting more than one server in automatic mode, "
+        "mirrors within SHUFFLE_THRESHOLD times the latency of the fastest "
+        "one are considered equally good and picked in random order, "
+        "to spread the load between them. Use 0 to always pick the "
+        "fastest mirrors. Not used in deep mode. Defaults to 2.",
+    )
+    group.add_argument(
+        "-t",
+        "--timeout",
+        action="store",
+        type=int,
+        default=10,
+        help="Timeout for deep mode and for each latency probe "
+        "in automatic mode. Defaults to 10 seconds.",
+    )
+    group.add_argument(
+        "-e",
+        "--exclude",
+        action="append",
+        dest="exclude",
+        default=None,
+        help="Exclude host from mirrors list.",
+    )
+
+    return parser
+
+
+_PARSER = _build_parser()
+
+
 class MirrorSelect:
     """Main operational class"""
 
@@ -71,23 +292,6 @@ class MirrorSelect:
         """
         self.output = output or Output()
 
-    @staticmethod
-    def _have_bin(name):
-        """Determines whether a particular binary is available
-        on the host system.  It searches in the PATH environment
-        variable paths.
-
-        @param name: string, binary name to search for
-        @rtype: string or None
-        """
-        for path_dir in os.environ.get("PATH", "").split(":"):
-            if not path_dir:
-                continue
-            file_path = os.path.join(path_dir, name)
-            if os.path.isfile(file_path) and os.access(file_path, os.X_OK):
-                return file_path
-        return None
-
     def change_config(self, hosts, out, config_path, sync=False):
         """Writes the config changes to the given file, or to stdout.
 
@@ -102,9 +306,7 @@ class MirrorSelect:
         else:
             var = "GENTOO_MIRRORS"
 
-        for i in range(0, len(hosts)):
-            if isinstance(hosts[i], bytes):
-                hosts[i] = hosts[i].decode("utf-8")
+        hosts = [x.decode("utf-8") if isinstance(x, bytes) else x for x in hosts]
 
         if var == "sync-uri" and out:
             mirror_string = "{} = {}".format(var, " ".join(hosts))
@@ -127,216 +329,16 @@ class MirrorSelect:
     def _parse_args(self, argv, config_path):
         """
         Does argument parsing and some sanity checks.
-        Returns an optparse Options object.
+        Returns an argparse Namespace object.
 
         The descriptions, grouping, and possibly the amount sanity checking
         need some finishing touches.
         """
-        desc = "\n".join(
-            (
-                self.output.white("examples:"),
-                "",
-                self.output.white("	 automatic:"),
-                "		 # mirrorselect -s5",
-                "		 # mirrorselect -s3 -b10 -o >> /mnt/gentoo/etc/portage/make.conf",
-                "		 # mirrorselect -D -s4",
-                "",
-                self.output.white("	 interactive:"),
-                "		 # mirrorselect -i -r",
-            )
-        )
-
-        def set_servers(option, opt_str, value, parser):
-            set_servers.user_configured = True
-            setattr(parser.values, option.dest, value)
-
-        parser = OptionParser(
-            formatter=ColoredFormatter(self.output),
-            description=desc,
-            version="Mirrorselect version: %s" % version,
-        )
-
-        group = parser.add_option_group("Main modes")
-        group.add_option(
-            "-a",
-            "--all_mirrors",
-            action="store_true",
-            default=False,
-            help="This will present a list of all filtered search results "
-            "to make it possible to select mirrors you wish to use. "
-            " For the -r, --rsync option, it will select the rotation server "
-            "only. As multiple rsync URL's are not supported.",
-        )
-        group.add_option(
-            "-D",
-            "--deep",
-            action="store_true",
-            default=False,
-            help="Deep mode. This is used to give a more accurate "
-            "speed test. It will download a 100k file from "
-            "each server. Because of this you should only use "
-            "this option if you have a good connection.",
-        )
-        group.add_option(
-            "-i",
-            "--interactive",
-            action="store_true",
-            default=False,
-            help="Interactive Mode, this will present a list "
-            "to make it possible to select mirrors you wish to use.",
-        )
-
-        group = parser.add_option_group("Server type selection (choose at most one)")
-        group.add_option(
-            "-c",
-            "--country",
-            action="store",
-            default=None,
-            help="only use mirrors from the specified country "
-            "NOTE: Names with a space must be quoted "
-            "eg.:  -c 'South Korea'",
-        )
-        group.add_option(
-            "-F",
-            "--ftp",
-            action="store_true",
-            default=False,
-            help="ftp only mode. Will not consider hosts of other " "types.",
-        )
-        group.add_option(
-            "-H",
-            "--http",
-            action="store_true",
-            default=False,
-            help="http only mode. Will not consider hosts of other types",
-        )
-        group.add_option(
-            "-S",
-            "--https",
-            action="store_true",
-            default=False,
-            help="https only mode. Will not consider hosts of other types",
-        )
-        group.add_option(
-            "-r",
-            "--rsync",
-            action="store_true",
-            default=False,
-            help="rsync mode. Allows you to interactively select your"
-            " rsync mirror. Requires -i or -a to be used.",
-        )
-        group.add_option(
-            "-R",
-            "--region",
-            action="store",
-            default=None,
-            help="only use mirrors from the specified region "
-            "NOTE: Names with a space must be quoted "
-            "eg.:  -R 'North America'",
-        )
-        group.add_option(
-            "-4", "--ipv4", action="store_true", default=False, help="only use IPv4"
-        )
-        group.add_option(
-            "-6", "--ipv6", action="store_true", default=False, help="only use IPv6"
-        )
-
-        group = parser.add_option_group("Other options")
-        group.add_option(
-            "-b",
-            "--blocksize",
-            action="store",
-            type="int",
-            help="This is to be used in automatic mode "
-            "and will split the hosts into blocks of BLOCKSIZE for "
-            "use with netselect. This is required for certain "
-            "routers which block 40+ requests at any given time. "
-            "Recommended parameters to pass are: -s3 -b10",
-        )
-        group.add_option(
-            "-d",
-            "--debug",
-            action="store",
-            type="int",
-            dest="verbosity",
-            default=1,
-            help="debug mode, pass in the debug level [1-9]",
-        )
-        group.add_option(
-            "-f",
-            "--file",
-            action="store",
-            default="mirrorselect-test",
-            help="An alternate file to download for deep testing. "
-            "Please choose the file carefully as to not abuse the system "
-            "by selecting an overly large size file.  You must also "
-            " use the -m, --md5 option.",
-        )
-        group.add_option(
-            "-m",
-            "--md5",
-            action="store",
-            default="bdf077b2e683c506bf9e8f2494eeb044",
-            help="An alternate file md5sum value used to compare the downloaded "
-            "file against for deep testing.",
-        )
-        group.add_option(
-            "-o",
-            "--output",
-            action="store_true",
-            default=False,
-            help="Output Only Mode, this is especially useful "
-            "when being used during installation, to redirect "
-            "output to a file other than %s" % config_path,
-        )
-        group.add_option(
-            "-P",
-            "--proxy",
-            action="store",
-            default=None,
-            help="Proxy server to use if not the default proxy " "in the environment",
-        )
-        group.add_option(
-            "-q",
-            "--quiet",
-            action="store_const",
-            const=0,
-            dest="verbosity",
-            help="Quiet mode",
-        )
-        group.add_option(
-            "-s",
-            "--servers",
-            action="callback",
-            callback=set_servers,
-            type="int",
-            default=1,
-            help="Specify Number of servers for Automatic Mode "
-            "to select. this is only valid for download mirrors. "
-            "If this is not specified, a default of 1 is used.",
-        )
-        group.add_option(
-            "-t",
-            "--timeout",
-            action="store",
-            type="int",
-            default="10",
-            help="Timeout for deep mode. Defaults to 10 seconds.",
-        )
-        group.add_option(
-            "-e",
-            "--exclude",
-            action="append",
-            dest="exclude",
-            default=None,
-            help="Exclude host from mirrors list.",
-        )
-
         if len(argv) == 1:
-            parser.print_help()
+            _PARSER.print_help()
             sys.exit(1)
 
-        options, args = parser.parse_args(argv[1:])
+        options = _PARSER.parse_args(argv[1:])
 
         # sanity checks
 
@@ -354,26 +356,23 @@ class MirrorSelect:
         if options.rsync and not (options.interactive or options.all_mirrors):
             self.output.print_err("rsync servers can only be selected with -i or -a")
 
-        if options.all_mirrors and hasattr(set_servers, "user_configured"):
+        if options.all_mirrors and options.servers is not None:
             self.output.print_err("Choose at most one of -s or -a")
 
+        if options.servers is None:
+            options.servers = 1
+
+        if options.blocksize is not None and options.blocksize < 1:
+            self.output.print_err("The -b option requires a BLOCKSIZE of at least 1")
+
         if options.interactive and (
             options.deep or options.blocksize or options.servers > 1
         ):
             self.output.print_err("Invalid option combination with -i")
 
-        if (not options.deep) and (not self._have_bin("netselect")):
-            self.output.print_err(
-                "You do not appear to have netselect on your system. "
-                "You must use the -D flag"
-            )
-
         if (os.getuid() != rootuid) and not options.output:
             self.output.print_err("Must be root to write to %s!\n" % config_path)
 
-        if args:
-            self.output.print_err("Unexpected arguments passed.")
-
         # return results
         return options
 
@@ -401,7 +400,7 @@ class MirrorSelect:
         the options passed in to run one of the three selector types.
         1) Interactive ncurses dialog
         2) Deep mode mirror selection.
-        3) (Shallow) Rapid server selection via netselect
+        3) (Shallow) Rapid server selection via concurrent latency probes
 
         @param hosts: list of hosts to choose from
         @param options: parser.parse_args() options instance
@@ -413,6 +412,10 @@ class MirrorSelect:
             selector = Deep(hosts, options, self.output)
         else:
             selector = Shallow(hosts, options, self.output)
+            if selector.ranked and options.servers > 1:
+                return shuffle_ranked(
+                    selector.ranked, options.servers, options.shuffle_threshold
+                )
         return selector.urls
 
     def get_conf_path(self, rsync=False):
@@ -459,9 +462,9 @@ class MirrorSelect:
         hosts = self.get_available_hosts(options)
 
         if options.all_mirrors:
-            urls = sorted([url for url, args in list(hosts)])
+            urls = sorted(url for url, args in hosts)
             if options.rsync:
-                urls = [urls[0]]
+                urls = urls[:1]
         else:
             urls = self.select_urls(hosts, options)
 
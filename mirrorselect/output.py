@@ -28,13 +28,12 @@ Distributed under the terms of the GNU General Public License v2
 """
 
 
+import argparse
 import sys
 import re
 import codecs
 import locale
 
-from optparse import IndentedHelpFormatter
-
 
 def encoder(text, _encoding_):
     return codecs.encode(text, _encoding_, "replace")
@@ -131,48 +130,33 @@ class Output:
             self.file.flush()
 
 
-class ColoredFormatter(IndentedHelpFormatter):
+class ColoredFormatter(argparse.RawDescriptionHelpFormatter):
 
     """HelpFormatter with colorful output.
 
-    Extends format_option.
-    Overrides format_heading.
+    Extends _format_action and start_section.
+    The description is not wrapped.
     """
 
-    def __init__(self, output):
-        IndentedHelpFormatter.__init__(self)
-        self.output = output
+    def __init__(self, prog, output=None, **kwargs):
+        argparse.RawDescriptionHelpFormatter.__init__(self, prog, **kwargs)
+        self.output = output or Output()
 
-    def format_heading(self, heading):
-        """Return a colorful heading."""
-        return "%*s%s:\n" % (self.current_indent, "", self.output.white(heading))
+    def start_section(self, heading):
+        """Start a section with a colorful heading."""
+        argparse.RawDescriptionHelpFormatter.start_section(
+            self, self.output.white(heading)
+        )
 
-    def format_option(self, option):
+    def _format_action(self, action):
         """Return colorful formatted help for an option."""
-        option = IndentedHelpFormatter.format_option(self, option)
-        # long options with args
-        option = re.sub(
-            r"--([a-zA-Z]*)=([a-zA-Z]*)",
-            lambda m: "-{} {}".format(
-                self.output.green(m.group(1)), self.output.blue(m.group(2))
-            ),
-            option,
-        )
-        # short options with args
-        option = re.sub(
-            r"-([a-zA-Z]) ?([0-9A-Z]+)",
-            lambda m: " -"
-            + self.output.green(m.group(1))
-            + " "
-            + self.output.blue(m.group(2)),
-            option,
+        text = argparse.RawDescriptionHelpFormatter._format_action(self, action)
+        invocation = self._format_action_invocation(action)
+        colored = re.sub(
+            r"(--?)([\w-]+)( [A-Z0-9_]+)?",
+            lambda m: m.group(1)
+            + self.output.green(m.group(2))
+            + (" " + self.output.blue(m.group(3)[1:]) if m.group(3) else ""),
+            invocation,
         )
-        # options without args
-        option = re.sub(
-            r"-([a-zA-Z\d]+)", lambda m: "-" + self.output.green(m.group(1)), option
-        )
-        return option
-
-    def format_description(self, description):
-        """Do not wrap."""
-        return description + "\n"
+        return text.replace(invocation, colored, 1)
@@ -28,8 +28,10 @@ Distributed under the terms of the GNU General Public License v2
 """
 
 from mirrorselect.output import encoder, get_encoding, decode_selection
+import asyncio
 import http.client
 import math
+import random
 import signal
 import socket
 import ssl
@@ -49,158 +51,159 @@ url_request = urllib.request.Request
 HTTPError = urllib.error.HTTPError
 
 
-# The netselect --ipv4 and --ipv6 options are supported only
-# with >=net-analyzer/netselect-0.4[ipv6(+)].
-NETSELECT_SUPPORTS_IPV4_IPV6 = True
+# Default ports for the protocols found in the mirror lists.
+PROBE_PORTS = {"http": 80, "https": 443, "ftp": 21, "rsync": 873}
+
+# Number of latency probes in flight at once, unless set with -b.
+# The upper bound avoids running out of file descriptors and keeps
+# the probes from queueing behind each other and skewing the timings.
+DEFAULT_CONCURRENT_PROBES = 32
+MAX_CONCURRENT_PROBES = 64
 
 
 class Shallow:
-    """handles rapid server selection via netselect"""
+    """handles rapid server selection via concurrent latency probes"""
 
     def __init__(self, hosts, options, output):
         self._options = options
         self.output = output
         self.urls = []
+        self.ranked = []
 
-        if options.blocksize is not None:
-            self.netselect_split(hosts, options.servers, options.blocksize)
+        if options.ipv4:
+            self._addr_family = socket.AF_INET
+        elif options.ipv6:
+            self._addr_family = socket.AF_INET6
         else:
-            self.netselect(hosts, options.servers)
+            self._addr_family = socket.AF_UNSPEC
+
+        self.probe_hosts(hosts, options.servers)
 
         if len(self.urls) == 0:
             self.output.print_err(
-                "Netselect failed to return any mirrors." " Try again using block mode."
+                "Failed to get a response from any of the mirrors."
+                " Check your internet connection."
             )
 
-    def netselect(self, hosts, number, quiet=False):
+    def probe_hosts(self, hosts, number):
         """
-        Uses Netselect to choose the closest hosts, _very_ quickly
+        Measures the latency of all hosts concurrently and keeps the
+        number fastest ones.  At most blocksize (default 32, capped
+        at 64) probes are in flight at any given time.
         """
-        if not quiet:
-            hosts = [host[0] for host in hosts]
-        top_host_dict = {}
-        top_hosts = []
-
-        if not quiet:
-            self.output.print_info(
-                "Using netselect to choose the top " "%d mirrors..." % number
-            )
-
-        host_string = " ".join(hosts)
-
-        cmd = ["netselect", "-s%d" % (number,)]
-
-        if NETSELECT_SUPPORTS_IPV4_IPV6:
-            if self._options.ipv4:
-                cmd.append("-4")
-            elif self._options.ipv6:
-                cmd.append("-6")
-
-        cmd.extend(hosts)
-
-        self.output.write('\nnetselect(): running "%s"\n' % " ".join(cmd), 2)
-
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        hosts = [host[0] for host in hosts]
+        concurrency = min(
+            self._options.blocksize or DEFAULT_CONCURRENT_PROBES,
+            MAX_CONCURRENT_PROBES,
+        )
 
-        out, err = proc.communicate()
+        self.output.print_info(
+            "Probing %d mirrors to choose the top %d..." % (len(hosts), number)
+        )
 
-        if err:
-            self.output.write("netselect(): netselect stderr: %s\n" % err, 2)
+        results = asyncio.run(self._probe_all(hosts, concurrency))
 
-        for line in out.splitlines():
-            line = line.split()
-            if len(line) < 2:
-                continue
-            top_hosts.append(line[1])
-            top_host_dict[line[0]] = line[1]
+        self.ranked = sorted(
+            ((url, latency) for url, latency in results if latency is not None),
+            key=lambda x: x[1],
+        )
 
-        if not quiet:
-            self.output.write("Done.\n")
+        self.output.write("Done.\n")
 
         self.output.write(
-            f"\nnetselect(): returning {top_hosts} and {top_host_dict}\n", 2
+            "\nprobe_hosts(): %d of %d hosts responded\n"
+            % (len(self.ranked), len(hosts)),
+            2,
         )
 
-        if quiet:
-            return top_hosts, top_host_dict
-        else:
-            self.urls = top_hosts
-
-    def netselect_split(self, hosts, number, block_size):
-        """
-        This uses netselect to test mirrors in chunks,
-        each at most block_size in length.
-        This is done in a tournament style.
-        """
-        hosts = [host[0] for host in hosts]
-
-        self.output.write("netselect_split() got %s hosts.\n" % len(hosts), 2)
-
-        host_blocks = self.host_blocks(hosts, block_size)
-
-        self.output.write(" split into %s blocks\n" % len(host_blocks), 2)
-
-        top_hosts = []
-        ret_hosts = {}
-
-        block_index = 0
-        for block in host_blocks:
-            self.output.print_info(
-                "Using netselect to choose the top "
-                "%d hosts, in blocks of %s. %s of %s blocks complete."
-                % (number, block_size, block_index, len(host_blocks))
-            )
-
-            host_dict = self.netselect(block, len(block), quiet=True)[1]
-
+        if self.ranked:
+            latencies = [latency for url, latency in self.ranked]
             self.output.write(
-                f"ran netselect({block}, {len(block)}), and got {host_dict}\n",
+                "probe_hosts(): latency p50 %.3f s, p99 %.3f s\n"
+                % (
+                    latencies[len(latencies) // 2],
+                    latencies[int(len(latencies) * 0.99)],
+                ),
                 2,
             )
 
-            for key in list(host_dict.keys()):
-                ret_hosts[key] = host_dict[key]
-            block_index += 1
-
-        sys.stderr.write(
-            "\rUsing netselect to choose the top"
-            "%d hosts, in blocks of %s. %s of %s blocks complete.\n"
-            % (number, block_size, block_index, len(host_blocks))
-        )
-
-        host_ranking_keys = sorted(ret_hosts.keys())
-
-        for rank in host_ranking_keys[:number]:
-            top_hosts.append(ret_hosts[rank])
+        self.urls = [url for url, latency in self.ranked[:number]]
 
-        self.output.write("netselect_split(): returns %s\n" % top_hosts, 2)
+        self.output.write("probe_hosts(): returning %s\n" % self.urls, 2)
 
-        self.urls = top_hosts
+    async def _probe_all(self, hosts, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[self._probe(url, semaphore) for url in hosts])
 
-    def host_blocks(self, hosts, block_size):
+    async def _probe(self, url, semaphore):
         """
-        Takes a list of hosts and a block size,
-        and returns an list of lists of URLs.
-        Each of the sublists is at most block_size in length.
+        Times a TCP connect to a single url and returns (url, latency),
+        with a latency of None if the host could not be reached in time.
         """
-        host_array = []
-        mylist = []
+        url_parts = url_parse(url)
+        async with semaphore:
+            try:
+                delta = await asyncio.wait_for(
+                    self._connect_time(url_parts), self._options.timeout
+                )
+            except (OSError, KeyError, ValueError, asyncio.TimeoutError) as e:
+                self.output.write(f"_probe(): probing {url} failed: {e!r}\n", 2)
+                return url, None
 
-        while len(hosts) > block_size:
-            while len(mylist) < block_size:
-                mylist.append(hosts.pop())
-            host_array.append(mylist)
-            mylist = []
-        host_array.append(hosts)
+        self.output.write(f"_probe(): {delta} seconds for host {url}\n", 2)
+        return url, delta
 
-        self.output.write(
-            "\n_host_blocks(): returns "
-            "%s blocks, each about %s in size\n"
-            % (len(host_array), len(host_array[0])),
-            2,
+    async def _connect_time(self, url_parts):
+        """
+        Resolves the host, then times a non-blocking connect to it on the
+        event loop's selector.  Name resolution is not part of the result.
+        Each resolved address is tried in turn until one accepts.
+        """
+        if url_parts.hostname is None:
+            raise ValueError("no hostname in url")
+        loop = asyncio.get_running_loop()
+        port = url_parts.port or PROBE_PORTS[url_parts.scheme]
+        addrinfo = await loop.getaddrinfo(
+            url_parts.hostname,
+            port,
+            family=self._addr_family,
+            type=socket.SOCK_STREAM,
+            flags=socket.AI_ADDRCONFIG,
         )
-
-        return host_array
+        error = None
+        for family, type_, proto, _, sockaddr in addrinfo:
+            with socket.socket(family, type_, proto) as sock:
+                sock.setblocking(False)
+                stime = loop.time()
+                try:
+                    await loop.sock_connect(sock, sockaddr)
+                except OSError as e:
+                    self.output.write(
+                        "_connect_time(): connection to host %s failed for ip %s: %s\n"
+                        % (url_parts.hostname, sockaddr[0], e),
+                        2,
+                    )
+                    error = e
+                    continue
+                return loop.time() - stime
+        raise error or OSError("no address for %s" % url_parts.hostname)
+
+
+def shuffle_ranked(ranked, number, threshold):
+    """Picks number urls from a latency ranking.  The mirrors within
+    threshold times the best latency are shuffled, so that equally
+    good mirrors share the load, the rest keep their order.
+
+    @param ranked: list of (url, latency) tuples, fastest first
+    @param number: int, the number of urls to return
+    @param threshold: float, latency factor relative to the fastest mirror
+    @rtype: list
+    """
+    cutoff = ranked[0][1] * threshold
+    fast = [url for url, latency in ranked if latency <= cutoff]
+    rest = [url for url, latency in ranked if latency > cutoff]
+    random.shuffle(fast)
+    return (fast + rest)[:number]
 
 
 class TimeoutException(Exception):
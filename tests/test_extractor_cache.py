@@ -0,0 +1,132 @@
+# Copyright 2026 Gentoo Authors
+
+import importlib
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+import unittest
+from unittest import mock
+
+from mirrorselect.output import Output
+
+URL = "https://api.gentoo.org/mirrors/distfiles.xml"
+OLD = "<mirrors>old</mirrors>"
+NEW = "<mirrors>new</mirrors>"
+TIMESTAMP = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+class FakeConnector:
+    result = (False, "", "")
+    calls = []
+
+    def __init__(self, output, proxies, useragent):
+        pass
+
+    def fetch_content(self, url, tpath=None, climit=60):
+        self.calls.append(tpath)
+        return self.result
+
+
+class FetchCachedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.status_output = open(os.devnull, "w")
+        self.cache_path = os.path.join(self.tempdir, "mirrorselect", "distfiles.xml")
+        self.tpath = self.cache_path + ".timestamp"
+        FakeConnector.calls = []
+        FakeConnector.result = (False, "", "")
+
+        # ssl-fetch is only needed for the network access stubbed out here,
+        # stand in for it while the test runs if it is not installed
+        stubs = {}
+        if importlib.util.find_spec("sslfetch") is None:
+            sslfetch = types.ModuleType("sslfetch")
+            sslfetch.connections = types.ModuleType("sslfetch.connections")
+            sslfetch.connections.Connector = FakeConnector
+            stubs = {"sslfetch": sslfetch, "sslfetch.connections": sslfetch.connections}
+        patch = mock.patch.dict(sys.modules, stubs)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        extractor = importlib.import_module("mirrorselect.extractor")
+        self.ttl = extractor.CACHE_TTL
+        patches = (
+            mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.tempdir}),
+            mock.patch.object(extractor, "Connector", FakeConnector),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.extractor = extractor.Extractor.__new__(extractor.Extractor)
+        self.extractor.output = Output(out=self.status_output)
+        self.extractor.proxies = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        self.status_output.close()
+
+    def _populate(self, age):
+        os.makedirs(os.path.dirname(self.cache_path))
+        for path, text in ((self.cache_path, OLD), (self.tpath, TIMESTAMP)):
+            with open(path, "w") as f:
+                f.write(text)
+        mtime = time.time() - age
+        os.utime(self.cache_path, (mtime, mtime))
+
+    def _read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_fresh_hit(self):
+        self._populate(age=60)
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), OLD)
+        self.assertEqual(FakeConnector.calls, [])
+
+    def test_stale_not_modified(self):
+        self._populate(age=2 * self.ttl)
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), OLD)
+        self.assertEqual(FakeConnector.calls, [self.tpath])
+        self.assertLess(time.time() - os.path.getmtime(self.cache_path), self.ttl)
+        # the refreshed copy is used without asking the server again
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), OLD)
+        self.assertEqual(FakeConnector.calls, [self.tpath])
+
+    def test_stale_modified(self):
+        self._populate(age=2 * self.ttl)
+        new_timestamp = "Tue, 02 Jan 2024 00:00:00 GMT"
+        FakeConnector.result = (True, NEW, new_timestamp)
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), NEW)
+        self.assertEqual(FakeConnector.calls, [self.tpath])
+        self.assertEqual(self._read(self.cache_path), NEW)
+        self.assertEqual(self._read(self.tpath), new_timestamp)
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(self.cache_path))),
+            ["distfiles.xml", "distfiles.xml.timestamp"],
+        )
+
+    def test_cold_miss_failed(self):
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), "")
+        self.assertEqual(FakeConnector.calls, [None])
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_cold_miss_bytes(self):
+        FakeConnector.result = (True, NEW.encode("utf-8"), TIMESTAMP)
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), NEW.encode("utf-8"))
+        self.assertEqual(self._read(self.cache_path), NEW)
+        self.assertEqual(self._read(self.tpath), TIMESTAMP)
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), NEW)
+        self.assertEqual(FakeConnector.calls, [None])
+
+    def test_unreadable_cache(self):
+        self._populate(age=60)
+        with open(self.cache_path, "wb") as f:
+            f.write(b"\xff\xfe")
+        FakeConnector.result = (True, NEW, TIMESTAMP)
+        self.assertEqual(self.extractor.fetch_cached(URL, {}), NEW)
+        self.assertEqual(FakeConnector.calls, [None])
+        self.assertEqual(self._read(self.cache_path), NEW)
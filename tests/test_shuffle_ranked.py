@@ -0,0 +1,26 @@
+# Copyright 2026 Gentoo Authors
+
+import unittest
+
+from mirrorselect.selectors import shuffle_ranked
+
+
+class ShuffleRankedTestCase(unittest.TestCase):
+    ranked = [("a", 0.1), ("b", 0.15), ("c", 0.2), ("d", 0.5), ("e", 0.9)]
+
+    def test_shuffle_ranked(self):
+        for _ in range(20):
+            urls = shuffle_ranked(self.ranked, 4, 2.0)
+            self.assertEqual(len(urls), 4)
+            self.assertEqual(sorted(urls[:3]), ["a", "b", "c"])
+            self.assertEqual(urls[3], "d")
+
+    def test_shuffle_ranked_fast_bucket_beyond_number(self):
+        for _ in range(20):
+            urls = shuffle_ranked(self.ranked, 2, 2.0)
+            self.assertEqual(len(urls), 2)
+            self.assertTrue(set(urls) <= {"a", "b", "c"})
+
+    def test_shuffle_ranked_disabled(self):
+        urls = shuffle_ranked(self.ranked, 5, 0)
+        self.assertEqual(urls, ["a", "b", "c", "d", "e"])